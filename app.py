@@ -1,20 +1,83 @@
 """Streamlit SEO prompt ideation tool leveraging DataForSEO and OpenAI APIs."""
 from __future__ import annotations
 
+import asyncio
 import textwrap
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Iterable, List, Optional
+from typing import Callable, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urlparse
 
-import requests
+import httpx
+import orjson
 import streamlit as st
-from bs4 import BeautifulSoup
-from openai import OpenAI
+from bs4 import BeautifulSoup, SoupStrainer
+from openai import AsyncOpenAI
+from streamlit.runtime.scriptrunner import ScriptRunContext, add_script_run_ctx, get_script_run_ctx
 
 DATAFORSEO_ENDPOINT = "https://api.dataforseo.com/v3/serp/google/organic/live/regular"
 DEFAULT_USER_AGENT = (
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
     "(KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36"
 )
+_ALLOWED_ITEM_TYPES = frozenset({"organic", "featured_snippet", "answer_box"})
+_PARAGRAPHS = SoupStrainer("p")
+# Upper bound on downloaded page text; the extracted excerpt is only 2000 characters.
+_MAX_PAGE_CHARS = 512_000
+
+# Fixed instructions live in the system message; the user message carries only the
+# query-specific data that changes between requests.
+_SYSTEM_PROMPT = textwrap.dedent(
+    """\
+    Sei un consulente SEO senior che crea outline strategici completi.
+    Per la query indicata produci una proposta di contenuto che includa:
+    1. Obiettivo principale e KPI.
+    2. Intento di ricerca e micro-intenti correlati.
+    3. Struttura dettagliata (H1, H2, H3) con descrizione di ogni sezione.
+    4. Paragrafi chiave e punti da trattare.
+    5. Parole chiave e varianti a coda lunga, con relativo intento.
+    6. FAQ suggerite.
+    7. Elementi multimediali e call-to-action.
+    8. Schema markup e ottimizzazioni on-page specifiche.
+    Rispondi in Markdown ben strutturato.
+    """
+).strip()
+_SERP_ROW_TEMPLATE = "{position}. {title} — {url}\n   Snippet: {snippet}"
+_USER_PROMPT_TEMPLATE = textwrap.dedent(
+    """\
+    Query: "{query}"
+    - Località target: {location}
+    - Lingua target: {language}
+    - Pubblico di riferimento: {audience}
+    - Tono di voce richiesto: {tone}
+    - Note aggiuntive: {additional_notes}
+
+    Panoramica SERP attuale:
+    {serp_table}
+
+    Insight dai competitor:
+    {competitor_brief}
+    """
+).strip()
+
+
+@st.cache_resource
+def _http_client() -> httpx.Client:
+    """Return the process-wide HTTP/2 client shared by DataForSEO and competitor downloads."""
+    return httpx.Client(
+        transport=httpx.HTTPTransport(
+            http2=True,
+            retries=3,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        ),
+        timeout=30.0,
+        follow_redirects=True,
+        headers={"User-Agent": DEFAULT_USER_AGENT},
+    )
+
+
+_EXECUTOR = ThreadPoolExecutor(max_workers=10, thread_name_prefix="competitor-brief")
 
 
 @dataclass
@@ -25,6 +88,7 @@ class SerpResult:
     snippet: str
 
 
+@st.cache_data(ttl=3600, show_spinner=False)
 def fetch_serp_results(
     keyword: str,
     location_name: str,
@@ -34,7 +98,11 @@ def fetch_serp_results(
     password: str,
     device: str = "desktop",
 ) -> List[SerpResult]:
-    """Fetch SERP results from DataForSEO following the official API contract."""
+    """Fetch SERP results from DataForSEO following the official API contract.
+
+    Results are cached for an hour per combination of inputs, so Streamlit reruns
+    triggered by unrelated widgets do not re-bill the same SERP task.
+    """
     keyword = (keyword or "").strip()
     if not keyword:
         raise ValueError("La keyword da analizzare è obbligatoria per la richiesta DataForSEO.")
@@ -54,22 +122,22 @@ def fetch_serp_results(
         payload["language_name"] = language_name.strip()
     if location_name and location_name.strip():
         payload["location_name"] = location_name.strip()
-    response = requests.post(
+    response = _http_client().post(
         DATAFORSEO_ENDPOINT,
         auth=(login, password),
-        json=[payload],
-        timeout=30,
+        content=orjson.dumps([payload]),
+        headers={"Content-Type": "application/json"},
     )
     try:
         response.raise_for_status()
-    except requests.HTTPError as exc:  # noqa: PERF203 - explicit error handling
+    except httpx.HTTPStatusError as exc:  # noqa: PERF203 - explicit error handling
         if response.status_code == 401:
             raise ValueError(
                 "Accesso non autorizzato a DataForSEO. Verifica login, password e eventuali restrizioni IP."
             ) from exc
         raise
 
-    payload_response = response.json()
+    payload_response = orjson.loads(response.content)
     if payload_response.get("status_code") != 20000:
         raise ValueError(
             "Richiesta DataForSEO non riuscita: "
@@ -82,6 +150,7 @@ def fetch_serp_results(
         raise ValueError("La risposta dell'API DataForSEO non contiene task.")
 
     results: List[SerpResult] = []
+    results_append = results.append
     for task in tasks:
         if task.get("status_code") != 20000:
             status_code = task.get("status_code")
@@ -112,27 +181,22 @@ def fetch_serp_results(
                 continue
 
             for item in raw_items:
-                url = item.get("url")
+                get = item.get
+                url = get("url")
                 if not url:
                     continue
-                item_type = (item.get("type") or "").lower()
-                if item_type and not any(
-                    keyword in item_type
-                    for keyword in ("organic", "featured_snippet", "answer_box")
-                ):
+                item_type = (get("type") or "").lower()
+                if item_type and item_type not in _ALLOWED_ITEM_TYPES:
                     continue
 
-                serp_result = SerpResult(
-                    position=item.get("rank_group")
-                    or item.get("rank_absolute")
-                    or 0,
-                    title=item.get("title", ""),
-                    url=url,
-                    snippet=item.get("snippet")
-                    or item.get("description")
-                    or "",
+                results_append(
+                    SerpResult(
+                        position=get("rank_group") or get("rank_absolute") or 0,
+                        title=get("title", ""),
+                        url=url,
+                        snippet=get("snippet") or get("description") or "",
+                    )
                 )
-                results.append(serp_result)
 
     if not results:
         raise ValueError(
@@ -143,32 +207,92 @@ def fetch_serp_results(
     return results[:limit]
 
 
-def extract_text_from_html(html: str) -> str:
-    """Extract readable text from HTML."""
-    soup = BeautifulSoup(html, "html.parser")
-    for tag in soup(["script", "style", "noscript"]):
-        tag.decompose()
-    paragraphs = [p.get_text(strip=True) for p in soup.find_all("p")]
-    text = "\n".join(paragraphs)
-    return textwrap.shorten(text, width=2000, placeholder="…")
+def extract_text_from_html(html: str, width: int = 2000) -> str:
+    """Extract readable paragraph text from HTML, stopping once ``width`` is filled."""
+    soup = BeautifulSoup(html, "lxml", parse_only=_PARAGRAPHS)
+    paragraphs: List[str] = []
+    length = 0
+    for paragraph in soup.find_all("p"):
+        text = " ".join(paragraph.get_text(strip=True).split())
+        if not text:
+            continue
+        paragraphs.append(text)
+        length += len(text) + 1
+        if length > width + 1:
+            break
+    return textwrap.shorten("\n".join(paragraphs), width=width, placeholder="…")
 
 
-def fetch_competitor_content(url: str, timeout: int = 20) -> Optional[str]:
-    """Download and extract competitor page content."""
-    headers = {"User-Agent": DEFAULT_USER_AGENT}
-    try:
-        response = requests.get(url, headers=headers, timeout=timeout)
+def _is_html(content_type: str) -> bool:
+    """Return whether a Content-Type header may carry an HTML page."""
+    return not content_type or content_type.lower().startswith(("text/html", "application/xhtml+xml"))
+
+
+@st.cache_data(ttl=86400, show_spinner=False)
+def fetch_competitor_content(url: str) -> str:
+    """Download and extract competitor page content, cached per URL for a day.
+
+    Non-HTML pages and pages without paragraph text yield an empty string, which is
+    cached like any other result. HTTP and transport errors raise instead, so
+    ``st.cache_data`` does not store them and the page is retried on the next run.
+    """
+    with _http_client().stream("GET", url, timeout=20.0) as response:
         response.raise_for_status()
-    except requests.RequestException:
-        return None
-    return extract_text_from_html(response.text)
+        if not _is_html(response.headers.get("Content-Type", "")):
+            return ""
+        chunks: List[str] = []
+        total = 0
+        for chunk in response.iter_text(65536):
+            chunks.append(chunk)
+            total += len(chunk)
+            if total > _MAX_PAGE_CHARS:
+                break
+    return extract_text_from_html("".join(chunks))
+
+
+def _select_competitors(results: Iterable[SerpResult], max_competitors: int) -> List[SerpResult]:
+    """Pick up to ``max_competitors`` results in rank order, one per domain."""
+    selected: List[SerpResult] = []
+    seen_hosts: Set[str] = set()
+    for result in results:
+        if len(selected) >= max_competitors:
+            break
+        try:
+            host = (urlparse(result.url).hostname or "").removeprefix("www.")
+        except ValueError:
+            host = result.url
+        if host in seen_hosts:
+            continue
+        seen_hosts.add(host)
+        selected.append(result)
+    return selected
+
+
+def _fetch_in_script_ctx(ctx: Optional[ScriptRunContext], url: str) -> str:
+    """Run fetch_competitor_content on a worker thread bound to the script's run context."""
+    add_script_run_ctx(threading.current_thread(), ctx)
+    return fetch_competitor_content(url)
+
+
+def prefetch_competitor_content(
+    results: Iterable[SerpResult], max_competitors: int = 5
+) -> List[Tuple[SerpResult, Future[str]]]:
+    """Start downloading competitor pages on the shared executor."""
+    ctx = get_script_run_ctx()
+    return [
+        (result, _EXECUTOR.submit(_fetch_in_script_ctx, ctx, result.url))
+        for result in _select_competitors(results, max_competitors)
+    ]
 
 
-def build_competitor_brief(results: Iterable[SerpResult], max_competitors: int = 5) -> str:
-    """Create a compact summary of competitor content."""
+def build_competitor_brief(pages: Iterable[Tuple[SerpResult, Future[str]]]) -> str:
+    """Create a compact summary of competitor content from prefetched pages."""
     briefs: List[str] = []
-    for result in list(results)[:max_competitors]:
-        content = fetch_competitor_content(result.url)
+    for result, future in pages:
+        try:
+            content = future.result()
+        except (httpx.HTTPError, httpx.InvalidURL):
+            content = ""
         if not content:
             briefs.append(
                 f"- **{result.title}** ({result.url})\n  - Contenuto non disponibile, usa il titolo e lo snippet per l'analisi."
@@ -180,8 +304,8 @@ def build_competitor_brief(results: Iterable[SerpResult], max_competitors: int =
     return "\n".join(briefs)
 
 
-def generate_seo_prompts(
-    client: OpenAI,
+async def generate_seo_prompts(
+    client: AsyncOpenAI,
     query: str,
     location: str,
     language: str,
@@ -190,43 +314,27 @@ def generate_seo_prompts(
     tone: str,
     audience: str,
     additional_notes: str,
-) -> str:
-    """Generate SEO prompts leveraging OpenAI."""
-    serp_table = "\n".join(
-        f"{item.position}. {item.title} — {item.url}\n   Snippet: {item.snippet}" for item in serp_overview
-    )
-
-    user_prompt = f"""
-    Sei un consulente SEO senior incaricato di definire un contenuto che si posizioni
-    per la query: "{query}".
+    on_text: Optional[Callable[[str], None]] = None,
+) -> Tuple[str, Optional[str]]:
+    """Generate SEO prompts leveraging OpenAI, streaming partial text to ``on_text``.
 
-    Dati disponibili:
-    - Località target: {location}
-    - Lingua target: {language}
-    - Pubblico di riferimento: {audience or 'non specificato'}
-    - Tono di voce richiesto: {tone or 'neutro'}
-    - Note aggiuntive: {additional_notes or 'nessuna'}
-
-    Panoramica SERP attuale:
-    {serp_table}
-
-    Insight dai competitor:
-    {competitor_brief or 'Non sono disponibili contenuti da mostrare.'}
-
-    Produci una proposta completa per il contenuto che includa:
-    1. Obiettivo principale del contenuto e KPI.
-    2. Analisi dell'intento di ricerca con micro-intenti correlati.
-    3. Struttura dettagliata (H1, H2, H3) con descrizione per ogni sezione.
-    4. Suggerimenti di paragrafi chiave e punti da trattare.
-    5. Lista di parole chiave e varianti a coda lunga, con indicazione dell'intento.
-    6. Domande frequenti suggerite (FAQ).
-    7. Suggerimenti per elementi multimediali e call-to-action.
-    8. Indicazioni per schema markup e ottimizzazioni on-page specifiche.
-
-    Rispondi in formato Markdown ben strutturato.
+    Returns the generated text and, when the response was cut short (for example by
+    ``max_output_tokens``), the reason reported by the API; otherwise ``None``.
     """
+    serp_table = "\n".join([_SERP_ROW_TEMPLATE.format_map(vars(item)) for item in serp_overview])
+
+    user_prompt = _USER_PROMPT_TEMPLATE.format(
+        query=query,
+        location=location,
+        language=language,
+        audience=audience or "non specificato",
+        tone=tone or "neutro",
+        additional_notes=additional_notes or "nessuna",
+        serp_table=serp_table,
+        competitor_brief=competitor_brief or "Non sono disponibili contenuti da mostrare.",
+    )
 
-    response = client.responses.create(
+    async with client.responses.stream(
         model="gpt-4.1-mini",
         input=[
             {
@@ -234,7 +342,7 @@ def generate_seo_prompts(
                 "content": [
                     {
                         "type": "text",
-                        "text": "Sei un consulente SEO esperto che crea outline strategici completi.",
+                        "text": _SYSTEM_PROMPT,
                     }
                 ],
             },
@@ -244,8 +352,20 @@ def generate_seo_prompts(
             },
         ],
         temperature=0.6,
-    )
-    return response.output_text
+        max_output_tokens=4000,
+    ) as stream:
+        buffer = ""
+        async for event in stream:
+            if event.type == "response.output_text.delta":
+                buffer += event.delta
+                if on_text:
+                    on_text(buffer)
+        response = await stream.get_final_response()
+    incomplete_reason = None
+    if response.status == "incomplete":
+        details = response.incomplete_details
+        incomplete_reason = (details.reason if details else None) or "sconosciuto"
+    return response.output_text, incomplete_reason
 
 
 def main() -> None:
@@ -310,6 +430,10 @@ def main() -> None:
             )
             st.stop()
 
+        # Competitor pages depend only on the SERP URLs, so start downloading them
+        # while the results are being rendered.
+        competitor_pages = prefetch_competitor_content(serp_results)
+
         st.success("Risultati SERP recuperati.")
         st.write("### Top risultati SERP")
         for result in serp_results:
@@ -319,15 +443,21 @@ def main() -> None:
             )
 
         with st.spinner("Analisi contenuti competitor…"):
-            competitor_brief = build_competitor_brief(serp_results)
+            try:
+                competitor_brief = build_competitor_brief(competitor_pages)
+            except Exception as error:  # noqa: BLE001
+                st.error(f"Errore durante l'analisi dei competitor: {error}")
+                st.stop()
 
         st.write("### Insight dai competitor")
         st.markdown(competitor_brief or "Nessun contenuto disponibile")
 
-        with st.spinner("Generazione outline con OpenAI…"):
-            client = OpenAI(api_key=openai_api_key)
-            try:
-                seo_prompt = generate_seo_prompts(
+        st.write("### Spunti ottimizzati per la SEO")
+        outline_placeholder = st.empty()
+
+        async def generate_outline() -> Tuple[str, Optional[str]]:
+            async with AsyncOpenAI(api_key=openai_api_key) as client:
+                return await generate_seo_prompts(
                     client=client,
                     query=keyword,
                     location=location_name,
@@ -337,13 +467,22 @@ def main() -> None:
                     tone=tone,
                     audience=audience,
                     additional_notes=additional_notes,
+                    on_text=outline_placeholder.markdown,
                 )
+
+        with st.spinner("Generazione outline con OpenAI…"):
+            try:
+                seo_prompt, incomplete_reason = asyncio.run(generate_outline())
             except Exception as error:  # noqa: BLE001
                 st.error(f"Errore durante la generazione con OpenAI: {error}")
                 st.stop()
 
-        st.write("### Spunti ottimizzati per la SEO")
-        st.markdown(seo_prompt)
+        outline_placeholder.markdown(seo_prompt)
+        if incomplete_reason:
+            st.warning(
+                "L'outline generato è incompleto "
+                f"(motivo: {incomplete_reason}): verifica la parte finale prima di utilizzarlo."
+            )
 
         st.download_button(
             "Scarica outline in Markdown",
@@ -0,0 +1,14 @@
+"""Regression tests for the SEO Prompt Generator helpers."""
+import textwrap
+
+from app import extract_text_from_html
+
+
+def test_extract_text_early_exit_matches_full_shorten() -> None:
+    paragraphs = ["a" * 10, "b" * 9, "c" * 5]
+    html = "".join(f"<p>{text}</p>" for text in paragraphs)
+
+    expected = textwrap.shorten("\n".join(paragraphs), width=20, placeholder="…")
+
+    assert expected == "aaaaaaaaaa…"
+    assert extract_text_from_html(html, width=20) == expected